@@ -2,24 +2,167 @@
 """
 Multi-file TempEval Visualization
 
-Generates a single HTML page with all TML files visualized in tabs.
-Creates a fully offline version with embedded D3.js library.
+Generates a single HTML page with all TML files visualized in tabs, with
+the D3.js library embedded. The raw XML is written to data/xml/ next to it,
+which must be served over HTTP; pass --embed-xml for a fully offline page
+in a single file.
 
 Usage:
     python visualize_all.py data/taskAB/
     python visualize_all.py data/taskAB/ data/taskC/
     python visualize_all.py data/taskAB/ --output all_files.html
     python visualize_all.py data/taskAB/ data/taskC/ --limit 10  # Only first 10 files
+    python visualize_all.py data/taskAB/ --gzip  # Writes all_files.html.gz
+    python visualize_all.py data/taskAB/ --embed-xml  # Single self-contained file
+    python visualize_all.py data/taskAB/ --split-data  # Per-file data in data/, loaded on demand
 """
  
-import xml.etree.ElementTree as ET
 import argparse
 import sys
 import os
+import io
+import functools
+import gzip
+import hashlib
+import math
+import pickle
+import random
+import shutil
 from pathlib import Path
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import json
 
+try:
+    from lxml import etree as ET
+    HAVE_LXML = True
+except ImportError:
+    # The stdlib iterparse already runs on expat and the C TreeBuilder
+    # (_elementtree), so no explicit parser needs to be passed
+    import xml.etree.ElementTree as ET
+    HAVE_LXML = False
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+# Tags handled while streaming through a TML file
+PARSED_TAGS = ('EVENT', 'TIMEX3', 'TLINK', 's')
+# lxml can filter tags in C; the stdlib iterparse has no such option
+ITERPARSE_OPTIONS = {'tag': PARSED_TAGS} if HAVE_LXML else {}
+
+# Node kinds, stored in graph data by their index in this tuple
+NODE_TYPES = ('event', 'timex')
+EVENT_NODE, TIMEX_NODE = range(len(NODE_TYPES))
+
+# Escapes text for HTML content and double- or single-quoted attributes
+HTML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'})
+
+# Legend shown above every graph; the same for all files
+RELATION_LEGEND = """                <div class="relation-legend">
+                    <h4>Temporal Relations Legend</h4>
+                    <div class="legend-items">
+                        <div class="legend-item">
+                            <div class="legend-color" style="background-color: #e74c3c;"></div>
+                            <div>
+                                <div class="legend-label">BEFORE</div>
+                                <div class="legend-description">Source → Target: Source occurs before target</div>
+                            </div>
+                        </div>
+                        <div class="legend-item">
+                            <div class="legend-color" style="background-color: #9b59b6;"></div>
+                            <div>
+                                <div class="legend-label">AFTER</div>
+                                <div class="legend-description">Source → Target: Source occurs after target</div>
+                            </div>
+                        </div>
+                        <div class="legend-item">
+                            <div class="legend-color" style="background-color: #f39c12;"></div>
+                            <div>
+                                <div class="legend-label">OVERLAP</div>
+                                <div class="legend-description">Source → Target: Events overlap in time</div>
+                            </div>
+                        </div>
+                        <div class="legend-item">
+                            <div class="legend-color" style="background-color: #16a085;"></div>
+                            <div>
+                                <div class="legend-label">BEFORE-OR-OVERLAP</div>
+                                <div class="legend-description">Source → Target: Before or overlapping (ambiguous)</div>
+                            </div>
+                        </div>
+                        <div class="legend-item">
+                            <div class="legend-color" style="background-color: #d35400;"></div>
+                            <div>
+                                <div class="legend-label">OVERLAP-OR-AFTER</div>
+                                <div class="legend-description">Source → Target: Overlapping or after (ambiguous)</div>
+                            </div>
+                        </div>
+                        <div class="legend-item">
+                            <div class="legend-color" style="background-color: #95a5a6;"></div>
+                            <div>
+                                <div class="legend-label">VAGUE</div>
+                                <div class="legend-description">Source → Target: Temporal relationship is unclear</div>
+                            </div>
+                        </div>
+                    </div>
+                </div>
+"""
+
+# Parsed files are cached here, keyed on their path, size and mtime, in a
+# subdirectory per CACHE_VERSION
+CACHE_DIR = Path('.tempeval_cache')
+# Bump whenever the structure of a parsed entry changes; older entries are
+# then removed on the next run
+CACHE_VERSION = 5
+
+
+def _release(elem):
+    """Free a processed element (and, under lxml, its already-seen siblings)
+    
+    The stdlib has no parent pointers, so there the cleared element stays in
+    the tree as an empty shell until the file is done.
+    """
+    elem.clear()
+    if HAVE_LXML:
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+
+def _escape(value):
+    """HTML-escape value (which may be None) in a single pass"""
+    return str(value).translate(HTML_ESCAPE)
+
+
+def _dumps(obj):
+    """Serialize obj to compact JSON text"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def _write_sidecar(path, data, compress):
+    """Write data (bytes) to path, and with compress a precompressed copy
+    to path.gz for servers that can send it as is (e.g. nginx gzip_static)"""
+    path.write_bytes(data)
+    if compress:
+        Path(f'{path}.gz').write_bytes(gzip.compress(data, compresslevel=9))
+
+
+def _write_json_array(f, items):
+    """Write items to f as JS that parses them from a JSON array string
+    
+    V8 parses JSON.parse("...") much faster than the equivalent object
+    literal. Items are serialized and quoted one at a time, with "</"
+    escaped so that the data cannot end the surrounding <script>.
+    """
+    f.write('JSON.parse("[')
+    for i, item in enumerate(items):
+        if i:
+            f.write(',')
+        f.write(json.dumps(_dumps(item), ensure_ascii=False)[1:-1].replace('</', '<\\/'))
+    f.write(']")')
+
 
 class TempEvalParser:
     def __init__(self, filepath):
@@ -28,213 +171,466 @@ class TempEvalParser:
         self.timexes = {}
         self.tlinks = []
         self.sentences = []
+        self._plain_sentences = []
+        # Per-id HTML wrapped around each occurrence in the annotated text
+        self._event_open = {}
+        self._event_tail = {}
+        self._timex_open = {}
+        self._timex_tail = {}
         self.raw_xml = None
+        self.error = None
         self.parse_file()
     
     def parse_file(self):
-        """Parse the TML file and extract annotations"""
+        """Parse the TML file and extract annotations in a single pass"""
         try:
-            # Read raw XML content
-            with open(self.filepath, 'r', encoding='utf-8') as f:
-                self.raw_xml = f.read()
+            # Read the file once; the parser is fed from the same bytes
+            data = Path(self.filepath).read_bytes()
+            self.raw_xml = data.decode('utf-8')
             
-            tree = ET.parse(self.filepath)
-            root = tree.getroot()
+            # Bound once, as the loop below runs for every annotation
+            events = self.events
+            timexes = self.timexes
+            event_open = self._event_open
+            event_tail = self._event_tail
+            timex_open = self._timex_open
+            timex_tail = self._timex_tail
+            add_tlink = self.tlinks.append
+            add_sentence = self.sentences.append
+            add_plain_sentence = self._plain_sentences.append
+            render_sentence = self._render_sentence
             
-            # Extract events
-            for event in root.findall('.//EVENT'):
-                eid = event.get('eid')
-                self.events[eid] = {
-                    'text': event.text or '',
-                    'class': event.get('class'),
-                    'tense': event.get('tense'),
-                    'aspect': event.get('aspect'),
-                    'polarity': event.get('polarity'),
-                    'pos': event.get('pos'),
-                    'stem': event.get('stem'),
-                    'mainevent': event.get('mainevent')
-                }
-            
-            # Extract time expressions
-            for timex in root.findall('.//TIMEX3'):
-                tid = timex.get('tid')
-                self.timexes[tid] = {
-                    'text': timex.text or '',
-                    'type': timex.get('type'),
-                    'value': timex.get('value'),
-                    'functionInDocument': timex.get('functionInDocument')
-                }
-            
-            # Extract temporal links
-            for tlink in root.findall('.//TLINK'):
-                self.tlinks.append({
-                    'lid': tlink.get('lid'),
-                    'relType': tlink.get('relType'),
-                    'eventID': tlink.get('eventID'),
-                    'timeID': tlink.get('timeID'),
-                    'relatedToEvent': tlink.get('relatedToEvent'),
-                    'relatedToTime': tlink.get('relatedToTime'),
-                    'task': tlink.get('task')
-                })
-            
-            # Extract sentences
-            for sentence in root.findall('.//s'):
-                self.sentences.append(self._render_sentence(sentence))
+            for _, elem in ET.iterparse(io.BytesIO(data), events=('end',), **ITERPARSE_OPTIONS):
+                tag = elem.tag
+                if tag == 'EVENT':
+                    # Kept intact until its enclosing sentence is rendered
+                    eid = elem.get('eid')
+                    event_class = elem.get('class')
+                    eid_html = _escape(eid)
+                    event_open[eid] = f'<span class="event" data-id="{eid_html}" title="ID: {eid_html}, Class: {_escape(event_class)}">'
+                    event_tail[eid] = f'</span><span class="event-id">[{eid_html}]</span>'
+                    text = elem.text or ''
+                    # Other attributes are available from get_event_details()
+                    events[eid] = {
+                        'text': text,
+                        'label': text[:15],
+                        'class': event_class
+                    }
+                elif tag == 'TIMEX3':
+                    tid = elem.get('tid')
+                    timex_value = elem.get('value')
+                    tid_html = _escape(tid)
+                    timex_open[tid] = f'<span class="timex" data-id="{tid_html}" title="ID: {tid_html}, Value: {_escape(timex_value)}">'
+                    timex_tail[tid] = f'</span><span class="timex-id">[{tid_html}]</span>'
+                    text = elem.text or ''
+                    # Other attributes are available from get_timex_details()
+                    timexes[tid] = {
+                        'text': text,
+                        'label': text[:15],
+                        'value': timex_value
+                    }
+                elif tag == 'TLINK':
+                    add_tlink({
+                        'lid': elem.get('lid'),
+                        'relType': elem.get('relType'),
+                        'eventID': elem.get('eventID'),
+                        'timeID': elem.get('timeID'),
+                        'relatedToEvent': elem.get('relatedToEvent'),
+                        'relatedToTime': elem.get('relatedToTime'),
+                        'task': elem.get('task')
+                    })
+                    _release(elem)
+                elif tag == 's':
+                    rendered, plain = render_sentence(elem)
+                    add_sentence(rendered)
+                    add_plain_sentence(plain)
+                    _release(elem)
                 
         except Exception as e:
+            self.error = e
             print(f"Error parsing {self.filepath}: {e}")
     
     def _render_sentence(self, elem):
-        """Render sentence to text with annotations"""
+        """Render sentence to text with annotations, along with its plain text"""
         result = []
+        plain = []
+        # Bound once, as the loop below runs for every annotated token
+        add_html = result.append
+        add_plain = plain.append
+        event_open, event_tail = self._event_open, self._event_tail
+        timex_open, timex_tail = self._timex_open, self._timex_tail
         
-        if elem.text:
-            result.append(elem.text)
+        text = elem.text
+        if text:
+            add_html(text.translate(HTML_ESCAPE))
+            add_plain(text)
         
         for child in elem:
-            if child.tag == 'EVENT':
+            tag = child.tag
+            text = child.text
+            if tag == 'EVENT':
                 eid = child.get('eid')
-                text = child.text or ''
-                event_class = self.events.get(eid, {}).get('class', '')
-                title = f"ID: {eid}, Class: {event_class}"
-                result.append(f'<span class="event" data-id="{eid}" title="{title}">{text}</span>')
-                result.append(f'<span class="event-id">[{eid}]</span>')
-            elif child.tag == 'TIMEX3':
+                add_html(event_open[eid])
+                add_html((text or '').translate(HTML_ESCAPE))
+                add_html(event_tail[eid])
+            elif tag == 'TIMEX3':
                 tid = child.get('tid')
-                text = child.text or ''
-                timex_value = self.timexes.get(tid, {}).get('value', '')
-                title = f"ID: {tid}, Value: {timex_value}"
-                result.append(f'<span class="timex" data-id="{tid}" title="{title}">{text}</span>')
-                result.append(f'<span class="timex-id">[{tid}]</span>')
+                add_html(timex_open[tid])
+                add_html((text or '').translate(HTML_ESCAPE))
+                add_html(timex_tail[tid])
             
-            if child.tail:
-                result.append(child.tail)
+            if text:
+                add_plain(text)
+            tail = child.tail
+            if tail:
+                add_html(tail.translate(HTML_ESCAPE))
+                add_plain(tail)
         
-        return ''.join(result)
+        return ''.join(result), ''.join(plain).strip()
+    
+    def get_event_details(self, eid):
+        """Get all attributes of an event, read from the XML on demand"""
+        return self._find_element_details('EVENT', 'eid', eid)
+    
+    def get_timex_details(self, tid):
+        """Get all attributes of a time expression, read from the XML on demand"""
+        return self._find_element_details('TIMEX3', 'tid', tid)
+    
+    def _find_element_details(self, tag, id_attr, element_id):
+        """Attributes and text of the `tag` element with the given id, or None"""
+        if not self.raw_xml:
+            return None
+        for _, elem in ET.iterparse(io.BytesIO(self.raw_xml.encode('utf-8')), events=('end',)):
+            if elem.tag == tag and elem.get(id_attr) == element_id:
+                return dict(elem.attrib, text=elem.text or '')
+        return None
     
     def get_plain_text(self):
         """Extract plain text without any XML tags"""
-        plain_text = []
-        try:
-            tree = ET.parse(self.filepath)
-            root = tree.getroot()
-            for sentence in root.findall('.//s'):
-                sentence_text = []
-                if sentence.text:
-                    sentence_text.append(sentence.text)
-                for child in sentence:
-                    if child.text:
-                        sentence_text.append(child.text)
-                    if child.tail:
-                        sentence_text.append(child.tail)
-                plain_text.append(''.join(sentence_text).strip())
-        except Exception:
-            pass
-        return '\n'.join(plain_text)
+        return '\n'.join(self._plain_sentences)
     
     def get_graph_data(self):
-        """Get nodes and links for graph"""
-        nodes = []
+        """Get nodes and links for graph, as one list per field
+        
+        Node `details` hold an event's class or a timex's value, and `x`/`y`
+        a precomputed layout in the unit square; links refer to nodes by
+        their position in the node lists.
+        """
+        ids, labels, types, full_texts, details = [], [], [], [], []
         node_ids = {}
         
         for eid, event in self.events.items():
-            node_ids[eid] = len(nodes)
-            nodes.append({
-                'id': eid,
-                'label': event['text'][:15],
-                'type': 'event',
-                'fullText': event['text'],
-                'class': event['class']
-            })
+            node_ids[eid] = len(ids)
+            ids.append(eid)
+            labels.append(event['label'])
+            types.append(EVENT_NODE)
+            full_texts.append(event['text'])
+            details.append(event['class'])
         
         for tid, timex in self.timexes.items():
-            node_ids[tid] = len(nodes)
-            nodes.append({
-                'id': tid,
-                'label': timex['text'][:15],
-                'type': 'timex',
-                'fullText': timex['text'],
-                'value': timex['value']
-            })
+            node_ids[tid] = len(ids)
+            ids.append(tid)
+            labels.append(timex['label'])
+            types.append(TIMEX_NODE)
+            full_texts.append(timex['text'])
+            details.append(timex['value'])
         
-        links = []
+        sources, targets, relations = [], [], []
         for tlink in self.tlinks:
             src = tlink['eventID'] or tlink['timeID']
             tgt = tlink['relatedToEvent'] or tlink['relatedToTime']
             
             if src and tgt and src in node_ids and tgt in node_ids:
-                links.append({
-                    'source': node_ids[src],
-                    'target': node_ids[tgt],
-                    'relation': tlink['relType'],
-                    'sourceId': src,
-                    'targetId': tgt
-                })
+                sources.append(node_ids[src])
+                targets.append(node_ids[tgt])
+                relations.append(tlink['relType'])
         
+        xs, ys = _graph_layout(len(ids), sources, targets)
+        nodes = {'ids': ids, 'labels': labels, 'types': types, 'fullTexts': full_texts, 'details': details,
+                 'x': xs, 'y': ys}
+        links = {'source': sources, 'target': targets, 'relation': relations}
         return nodes, links
 
 
-def generate_multi_file_html(files, output_path):
-    """Generate HTML with all files in tabs"""
+def _graph_layout(node_count, sources, targets):
+    """Layout of a graph, as x and y lists in [0, 1]
     
-    print(f"Processing {len(files)} files...")
-    all_data = []
+    Most nodes take part in no relation. In a force layout they only push
+    each other apart, yet make up most of its cost, so only linked nodes
+    are laid out with _spring_layout and the others are put in a grid to
+    their right.
+    """
+    edges = [(s, t) for s, t in zip(sources, targets) if s != t]
+    linked = sorted({node for edge in edges for node in edge})
+    position = {node: i for i, node in enumerate(linked)}
+    xs, ys = [0.0] * node_count, [0.0] * node_count
     
-    # Track which tasks exist across all files
-    global_tasks = set()
+    linked_xs, linked_ys = _spring_layout(len(linked), [position[s] for s, _ in edges],
+                                          [position[t] for _, t in edges])
+    for node, x, y in zip(linked, linked_xs, linked_ys):
+        xs[node], ys[node] = x, y
     
-    for i, filepath in enumerate(files, 1):
-        print(f"  [{i}/{len(files)}] {filepath.name}")
-        parser = TempEvalParser(str(filepath))
-        nodes, links = parser.get_graph_data()
+    isolated = [node for node in range(node_count) if node not in position]
+    if isolated:
+        columns = math.ceil(math.sqrt(len(isolated)))
+        rows = math.ceil(len(isolated) / columns)
+        offset = 1.0 if linked else 0.0
+        for i, node in enumerate(isolated):
+            row, column = divmod(i, columns)
+            xs[node] = offset + (column + 0.5) / columns
+            ys[node] = (row + 0.5) / rows
+    
+    return _normalize(xs), _normalize(ys)
+
+
+def _normalize(values):
+    """Rescale values to [0, 1], rounded to 4 places (all 0.5 if they are equal)"""
+    if not values:
+        return []
+    low, high = min(values), max(values)
+    if high == low:
+        return [0.5] * len(values)
+    return [round((value - low) / (high - low), 4) for value in values]
+
+
+def _spring_layout(node_count, sources, targets, iterations=20, gravity=0.5, seed=42):
+    """Fruchterman-Reingold layout of a graph, as x and y lists in [0, 1]
+    
+    Repulsion is only computed between nodes in neighbouring grid cells (the
+    grid variant of the algorithm), so an iteration stays close to linear in
+    the number of nodes. The seed keeps layouts identical between runs.
+    """
+    if node_count < 2:
+        return [0.5] * node_count, [0.5] * node_count
+    rng = random.Random(seed)
+    xs = [rng.random() for _ in range(node_count)]
+    ys = [rng.random() for _ in range(node_count)]
+    k = math.sqrt(1.0 / node_count)  # Ideal edge length
+    k2 = k * k
+    cell = 2 * k
+    reach2 = cell * cell
+    edges = [(s, t) for s, t in zip(sources, targets) if s != t]
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    
+    for _ in range(iterations):
+        dx = [0.0] * node_count
+        dy = [0.0] * node_count
         
-        # Count tasks
-        tasks = set()
-        task_counts = {'A': 0, 'B': 0, 'C': 0}
-        for tlink in parser.tlinks:
-            task = tlink.get('task')
-            if task:
-                tasks.add(task)
-                global_tasks.add(task)
-                task_counts[task] = task_counts.get(task, 0) + 1
+        grid = {}
+        for i in range(node_count):
+            grid.setdefault((int(xs[i] // cell), int(ys[i] // cell)), []).append(i)
+        for (cx, cy), members in grid.items():
+            near = [j for ox in (-1, 0, 1) for oy in (-1, 0, 1) for j in grid.get((cx + ox, cy + oy), ())]
+            for i in members:
+                xi, yi = xs[i], ys[i]
+                fx = fy = 0.0
+                for j in near:
+                    ddx = xi - xs[j]
+                    ddy = yi - ys[j]
+                    d2 = ddx * ddx + ddy * ddy
+                    if 0 < d2 < reach2:
+                        f = k2 / d2
+                        fx += ddx * f
+                        fy += ddy * f
+                dx[i] = fx
+                dy[i] = fy
         
-        all_data.append({
-            'filename': filepath.name,
-            'filepath': str(filepath),
-            'events': len(parser.events),
-            'timexes': len(parser.timexes),
-            'tlinks': len(parser.tlinks),
-            'sentences': parser.sentences,
-            'nodes': nodes,
-            'links': links,
-            'tasks': ','.join(sorted(tasks)),
-            'task_counts': task_counts,
-            'plain_text': parser.get_plain_text(),
-            'raw_xml': parser.raw_xml or ''
-        })
+        for s, t in edges:
+            ddx = xs[s] - xs[t]
+            ddy = ys[s] - ys[t]
+            f = math.sqrt(ddx * ddx + ddy * ddy) / k
+            dx[s] -= ddx * f
+            dy[s] -= ddy * f
+            dx[t] += ddx * f
+            dy[t] += ddy * f
+        
+        # Pull everything gently toward the centre so that unlinked nodes do
+        # not drift off, then move each node at most `temperature`
+        for i in range(node_count):
+            fx = dx[i] - (xs[i] - 0.5) * gravity
+            fy = dy[i] - (ys[i] - 0.5) * gravity
+            d = math.sqrt(fx * fx + fy * fy)
+            if d > 0:
+                step = min(d, temperature) / d
+                xs[i] += fx * step
+                ys[i] += fy * step
+        temperature -= cooling
     
-    # Calculate overall statistics
-    total_events = sum(d['events'] for d in all_data)
-    total_timexes = sum(d['timexes'] for d in all_data)
-    total_tlinks = sum(d['tlinks'] for d in all_data)
+    # Rescale to fill the unit square
+    min_x, min_y = min(xs), min(ys)
+    span = max(max(xs) - min_x, max(ys) - min_y) or 1.0
+    return ([round((x - min_x) / span, 4) for x in xs],
+            [round((y - min_y) / span, 4) for y in ys])
+
+
+def _cache_path(filepath, cache_dir):
+    """Cache file for the current contents of filepath"""
+    st = os.stat(filepath)
+    key = f"{CACHE_VERSION}-{st.st_mtime_ns}-{st.st_size}-{os.path.abspath(filepath)}"
+    return cache_dir / f"{hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()}.pkl"
+
+
+def _prune_cache(cache_dir):
+    """Remove entries left in cache_dir by other CACHE_VERSIONs, and return
+    the directory for entries of the current one"""
+    current = cache_dir / f'v{CACHE_VERSION}'
+    for entry in os.scandir(cache_dir):
+        if entry.name == current.name:
+            continue
+        if entry.name[:1] == 'v' and entry.name[1:].isdigit() and entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.name.endswith(('.pkl', '.tmp')) and entry.is_file(follow_symlinks=False):
+            # Entries from before versions had their own directory
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    current.mkdir(exist_ok=True)
+    return current
+
+
+def _parse_one(filepath, cache_dir=None):
+    """Parse one TML file into its entry of the visualization data"""
+    cache_path = None
+    if cache_dir is not None:
+        try:
+            cache_path = _cache_path(filepath, cache_dir)
+        except OSError:
+            pass  # Missing or unreadable file, reported by the parser below
+    if cache_path is not None:
+        if cache_path.exists():
+            try:
+                with open(cache_path, 'rb') as f:
+                    return pickle.load(f)
+            except Exception:
+                pass  # Unreadable or stale entry, parse again
     
-    # Read D3.js library for embedding
-    d3_js = ""
+    parser = TempEvalParser(filepath)
+    nodes, links = parser.get_graph_data()
+    
+    # Count tasks, keeping A, B and C first even when absent
+    task_counts = Counter({'A': 0, 'B': 0, 'C': 0})
+    task_counts.update(tlink['task'] for tlink in parser.tlinks if tlink['task'])
+    tasks = {task for task, count in task_counts.items() if count}
+    
+    entry = {
+        'filename': Path(filepath).name,
+        'filepath': filepath,
+        'events': len(parser.events),
+        'timexes': len(parser.timexes),
+        'tlinks': len(parser.tlinks),
+        'sentences': parser.sentences,
+        'nodes': nodes,
+        'links': links,
+        'tasks': ','.join(sorted(tasks)),
+        'task_counts': dict(task_counts),
+        'plain_text': parser.get_plain_text(),
+        'raw_xml': parser.raw_xml or ''
+    }
+    
+    # Failed parses are not cached, so their error is reported on every run
+    if cache_path is not None and parser.error is None:
+        # Write under a private name first so concurrent runs never see partial files
+        tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # The cache is only an optimization, so carry on without this entry
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    
+    return entry
+
+
+@functools.lru_cache(maxsize=1)
+def _d3_js():
+    """Load the bundled D3.js library once, or return None if it is missing"""
     d3_path = Path(__file__).parent / 'd3.v7.min.js'
     if d3_path.exists():
-        with open(d3_path, 'r', encoding='utf-8') as f:
-            d3_js = f.read()
-        print(f"  Embedding D3.js library ({len(d3_js)} bytes) - fully offline version")
+        return d3_path.read_text(encoding='utf-8')
+    return None
+
+
+def generate_multi_file_html(files, output_path, cache_dir=CACHE_DIR, compress=False, embed_xml=False,
+                             split_data=False, jobs=None):
+    """Generate HTML with all files in tabs"""
+    
+    print(f"Processing {len(files)} files...")
+    all_data = []
+    
+    if cache_dir is not None:
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            cache_dir = _prune_cache(cache_dir)
+        except OSError as e:
+            print(f"  Warning: parse cache disabled, cannot create {cache_dir}: {e}")
+            cache_dir = None
+    
+    # Track which tasks exist across all files, and overall statistics
+    global_tasks = set()
+    total_events = total_timexes = total_tlinks = 0
+    
+    # Files are independent, so parse them on all cores (or `jobs` processes)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        parse = functools.partial(_parse_one, cache_dir=cache_dir)
+        results = executor.map(parse, [str(p) for p in files], chunksize=8)
+        for i, data in enumerate(results, 1):
+            print(f"  [{i}/{len(files)}] {data['filename']}")
+            all_data.append(data)
+            global_tasks.update(task for task, count in data['task_counts'].items() if count)
+            total_events += data['events']
+            total_timexes += data['timexes']
+            total_tlinks += data['tlinks']
+    
+    # Read D3.js library for embedding
+    d3_js = _d3_js()
+    if d3_js:
+        # Only a page with everything inline works offline as a single file
+        offline = ' - fully offline version' if embed_xml and not split_data else ''
+        print(f"  Embedding D3.js library ({len(d3_js)} bytes){offline}")
     else:
         print(f"  Warning: d3.v7.min.js not found, using CDN (requires internet)")
-        d3_js = None
     
-    html = f"""<!DOCTYPE html>
+    if not embed_xml:
+        # Raw XML is only needed when opened, so it is loaded from data/xml/<index>.xml
+        xml_dir = Path(output_path).parent / 'data' / 'xml'
+        xml_dir.mkdir(parents=True, exist_ok=True)
+        for i, data in enumerate(all_data):
+            _write_sidecar(xml_dir / f'{i}.xml', data['raw_xml'].encode('utf-8'), compress)
+        print(f"  Raw XML written to {xml_dir}/ (pages must be served over HTTP to load it)")
+    
+    if split_data:
+        # Graph data and plain text are loaded from data/<index>.json when a tab needs them
+        data_dir = Path(output_path).parent / 'data'
+        data_dir.mkdir(parents=True, exist_ok=True)
+        for i, data in enumerate(all_data):
+            payload = {'nodes': data['nodes'], 'links': data['links'], 'plainText': data['plain_text']}
+            _write_sidecar(data_dir / f'{i}.json', _dumps(payload).encode('utf-8'), compress)
+        print(f"  File data written to {data_dir}/ (pages must be served over HTTP to load it)")
+    
+    # The first tab needs its data straight away, so start fetching it early
+    preload = ('    <link rel="preload" as="fetch" href="data/0.json" type="application/json" crossorigin>\n'
+               if split_data and all_data else '')
+    
+    if compress:
+        # Compressed on the fly, so memory use stays the same as a plain write
+        output_path = f"{output_path}.gz"
+        out = gzip.open(output_path, 'wt', encoding='utf-8', compresslevel=6)
+    else:
+        out = open(output_path, 'w', encoding='utf-8', buffering=1 << 20)
+    
+    with out as f:
+        f.write(f"""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
     <title>TempEval Visualization - {len(files)} files</title>
-    <style>
+{preload}    <style>
         * {{
             margin: 0;
             padding: 0;
@@ -308,6 +704,9 @@ def generate_multi_file_html(files, output_path):
             color: white;
             font-weight: bold;
         }}
+        .tab.hidden {{
+            display: none;
+        }}
         .tab-content {{
             display: none;
             background-color: white;
@@ -442,11 +841,29 @@ def generate_multi_file_html(files, output_path):
             background-color: #27ae60;
             transform: scale(1.05);
         }}
+        /* Highlights last as long as their animation, then the class is dropped */
         .node-highlighted circle,
         .node-highlighted rect {{
-            stroke: #f39c12 !important;
-            stroke-width: 4 !important;
-            filter: drop-shadow(0 0 8px #f39c12);
+            animation: node-flash 2s;
+        }}
+        
+        @keyframes node-flash {{
+            from, to {{
+                stroke: #f39c12;
+                stroke-width: 4;
+                filter: drop-shadow(0 0 8px #f39c12);
+            }}
+        }}
+        
+        .text-highlighted {{
+            animation: text-flash 2s;
+        }}
+        
+        @keyframes text-flash {{
+            from, to {{
+                outline: 3px solid #f39c12;
+                outline-offset: 2px;
+            }}
         }}
         .relations-list {{
             margin-top: 10px;
@@ -634,7 +1051,11 @@ def generate_multi_file_html(files, output_path):
         }}
     </style>
     <script>
-{d3_js if d3_js else ""}
+""")
+        if d3_js:
+            # Written as-is rather than interpolated, to avoid copying it again
+            f.write(d3_js)
+        f.write(f"""
     </script>
     {"" if d3_js else '<script src="https://d3js.org/d3.v7.min.js"></script>'}
 </head>
@@ -741,31 +1162,32 @@ def generate_multi_file_html(files, output_path):
         </div>
         
         <div class="tabs" id="tabs">
-"""
-    
-    # Generate tabs
-    for i, data in enumerate(all_data):
-        active = ' active' if i == 0 else ''
-        tasks_str = data['tasks'] if data['tasks'] else 'none'
-        html += f'            <button class="tab{active}" onclick="showTab({i})" data-index="{i}" data-filename="{data["filename"]}" data-events="{data["events"]}" data-timexes="{data["timexes"]}" data-tlinks="{data["tlinks"]}" data-sentences="{len(data["sentences"])}" data-tasks="{tasks_str}">{data["filename"]}</button>\n'
-    
-    html += """        </div>
+""")
         
-"""
-    
-    # Generate tab contents
-    for i, data in enumerate(all_data):
-        active = ' active' if i == 0 else ''
-        # Only show tasks that exist in the dataset
-        task_parts = []
-        for task in sorted(global_tasks):
-            count = data['task_counts'].get(task, 0)
-            task_parts.append(f"Task {task}: <strong>{count}</strong>")
-        task_info = f"<div class=\"file-stat\">{' | '.join(task_parts)}</div>" if task_parts else ""
+        # Generate tabs
+        for i, data in enumerate(all_data):
+            active = ' active' if i == 0 else ''
+            tasks_str = _escape(data['tasks']) if data['tasks'] else 'none'
+            filename = _escape(data['filename'])
+            f.write(f'            <button class="tab{active}" onclick="showTab({i})" data-index="{i}" data-filename="{filename}" data-events="{data["events"]}" data-timexes="{data["timexes"]}" data-tlinks="{data["tlinks"]}" data-sentences="{len(data["sentences"])}" data-tasks="{tasks_str}">{filename}</button>\n')
+        
+        f.write("""        </div>
+        
+""")
         
-        html += f"""        <div class="tab-content{active}" id="tab-{i}">
-            <div class="file-header">
-                <h2>{data['filename']}</h2>
+        # Generate tab contents, only showing tasks that exist in the dataset
+        tasks = sorted(global_tasks)
+        for i, data in enumerate(all_data):
+            task_parts = []
+            for task in tasks:
+                count = data['task_counts'].get(task, 0)
+                task_parts.append(f"Task {_escape(task)}: <strong>{count}</strong>")
+            task_info = f"<div class=\"file-stat\">{' | '.join(task_parts)}</div>" if task_parts else ""
+            
+            parts = []
+            append = parts.append
+            append(f"""            <div class="file-header">
+                <h2>{_escape(data['filename'])}</h2>
                 <div class="file-stats">
                     <div class="file-stat">Events: <strong>{data['events']}</strong></div>
                     <div class="file-stat">Time Expressions: <strong>{data['timexes']}</strong></div>
@@ -774,61 +1196,16 @@ def generate_multi_file_html(files, output_path):
                     {task_info}
                 </div>
             </div>
-"""
-        
-        # Graph section
-        if data['nodes']:
-            html += f"""            
+""")
+            
+            nodes, links = data['nodes'], data['links']
+            
+            # Graph section
+            if nodes['ids']:
+                append(f"""            
             <div class="section">
                 <h3>Temporal Relations Graph</h3>
-                <div class="relation-legend">
-                    <h4>Temporal Relations Legend</h4>
-                    <div class="legend-items">
-                        <div class="legend-item">
-                            <div class="legend-color" style="background-color: #e74c3c;"></div>
-                            <div>
-                                <div class="legend-label">BEFORE</div>
-                                <div class="legend-description">Source → Target: Source occurs before target</div>
-                            </div>
-                        </div>
-                        <div class="legend-item">
-                            <div class="legend-color" style="background-color: #9b59b6;"></div>
-                            <div>
-                                <div class="legend-label">AFTER</div>
-                                <div class="legend-description">Source → Target: Source occurs after target</div>
-                            </div>
-                        </div>
-                        <div class="legend-item">
-                            <div class="legend-color" style="background-color: #f39c12;"></div>
-                            <div>
-                                <div class="legend-label">OVERLAP</div>
-                                <div class="legend-description">Source → Target: Events overlap in time</div>
-                            </div>
-                        </div>
-                        <div class="legend-item">
-                            <div class="legend-color" style="background-color: #16a085;"></div>
-                            <div>
-                                <div class="legend-label">BEFORE-OR-OVERLAP</div>
-                                <div class="legend-description">Source → Target: Before or overlapping (ambiguous)</div>
-                            </div>
-                        </div>
-                        <div class="legend-item">
-                            <div class="legend-color" style="background-color: #d35400;"></div>
-                            <div>
-                                <div class="legend-label">OVERLAP-OR-AFTER</div>
-                                <div class="legend-description">Source → Target: Overlapping or after (ambiguous)</div>
-                            </div>
-                        </div>
-                        <div class="legend-item">
-                            <div class="legend-color" style="background-color: #95a5a6;"></div>
-                            <div>
-                                <div class="legend-label">VAGUE</div>
-                                <div class="legend-description">Source → Target: Temporal relationship is unclear</div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-                <div class="graph-controls">
+{RELATION_LEGEND}                <div class="graph-controls">
                     <button onclick="resetGraph({i})">Reset</button>
                     <button onclick="fitToView({i})">Fit to View</button>
                     <button onclick="zoomIn({i})">Zoom In</button>
@@ -838,47 +1215,38 @@ def generate_multi_file_html(files, output_path):
                 </div>
                 <div class="graph-container" id="graph-{i}"></div>
             </div>
-"""
-        else:
-            html += '            <div class="no-graph">No temporal relations to display</div>\n'
-        
-        # Text section
-        html += f"""            <div class="section" id="text-section-{i}">
+""")
+            else:
+                append('            <div class="no-graph">No temporal relations to display</div>\n')
+            
+            # Text section
+            append(f"""            <div class="section" id="text-section-{i}">
                 <h3>Annotated Text</h3>
-"""
-        for j, sentence in enumerate(data['sentences'], 1):
-            html += f'                <div class="sentence"><strong>{j}.</strong> {sentence}</div>\n'
-        
-        html += f"""            </div>
+""")
+            parts.extend(f'                <div class="sentence"><strong>{j}.</strong> {sentence}</div>\n'
+                         for j, sentence in enumerate(data['sentences'], 1))
+            
+            append(f"""            </div>
             
             <div class="section">
-                <h3>Temporal Relations ({len(data['links'])})</h3>
+                <h3>Temporal Relations ({len(links['source'])})</h3>
                 <div class="relations-list">
-"""
-        
-        # Add temporal relations with actual text
-        if data['links']:
-            # Create a lookup for node text
-            node_lookup = {node['id']: node for node in data['nodes']}
+""")
             
-            for link in data['links']:
-                relation_type = link['relation']
-                source_id = link['sourceId']
-                target_id = link['targetId']
-                
-                # Get source and target text
-                source_node = node_lookup.get(source_id, {})
-                target_node = node_lookup.get(target_id, {})
-                source_text = source_node.get('fullText', source_id)
-                target_text = target_node.get('fullText', target_id)
-                
-                # Truncate long text
-                if len(source_text) > 30:
-                    source_text = source_text[:27] + '...'
-                if len(target_text) > 30:
-                    target_text = target_text[:27] + '...'
+            # Add temporal relations with actual text
+            if links['source']:
+                # Escape each node id, and truncate and escape each node's
+                # text, once however many relations the node is in
+                node_ids = [_escape(node_id) for node_id in nodes['ids']]
+                display_texts = [(text[:27] + '...' if len(text) > 30 else text).translate(HTML_ESCAPE)
+                                 for text in nodes['fullTexts']]
                 
-                html += f'''                    <div class="relation-item {relation_type}">
+                for source, target, relation in zip(links['source'], links['target'], links['relation']):
+                    relation_type = _escape(relation)
+                    source_id, source_text = node_ids[source], display_texts[source]
+                    target_id, target_text = node_ids[target], display_texts[target]
+                    
+                    append(f'''                    <div class="relation-item {relation_type}">
                         <span class="relation-type {relation_type}">{relation_type}</span>
                         <div style="display: inline-block; margin-left: 10px;">
                             <strong>{source_id}</strong> <span style="color: #7f8c8d; font-size: 12px;">({source_text})</span>
@@ -886,11 +1254,11 @@ def generate_multi_file_html(files, output_path):
                             <strong>{target_id}</strong> <span style="color: #7f8c8d; font-size: 12px;">({target_text})</span>
                         </div>
                     </div>
-'''
-        else:
-            html += '                    <p style="color: #7f8c8d;">No temporal relations in this file.</p>\n'
-        
-        html += f"""                </div>
+''')
+            else:
+                append('                    <p style="color: #7f8c8d;">No temporal relations in this file.</p>\n')
+            
+            append(f"""                </div>
             </div>
             
             <div class="section">
@@ -907,28 +1275,92 @@ def generate_multi_file_html(files, output_path):
                     </button>
                 </div>
             </div>
-        </div>
+""")
+            body = ''.join(parts)
+            if i == 0:
+                # The first tab is visible on load, so its content is inline
+                f.write(f'        <div class="tab-content active" id="tab-{i}">\n{body}        </div>\n        \n')
+            else:
+                # Other tabs stay inert until showTab() first opens them
+                f.write(f'        <div class="tab-content" id="tab-{i}"></div>\n'
+                        f'        <script type="text/template" id="tab-data-{i}">\n{body}        </script>\n        \n')
         
-"""
-    
-    html += """    </div>
+        f.write("""    </div>
     
     <script>
-        // Store all graph data
-        const allGraphData = """ + json.dumps([{'nodes': d['nodes'], 'links': d['links']} for d in all_data]) + """;
+        // Store all graph data (null when it is in data/<index>.json)
+        const allGraphData = """)
+        if split_data:
+            f.write('null')
+        else:
+            _write_json_array(f, ({'nodes': d['nodes'], 'links': d['links']} for d in all_data))
+        f.write(""";
+        const NODE_TYPES = """)
+        f.write(_dumps(NODE_TYPES))
+        f.write(""";
         const graphInstances = {};
         
-        // Store plain text and raw XML data
-        const allPlainTextData = """ + json.dumps([d['plain_text'] for d in all_data], ensure_ascii=False) + """;
-        const allRawXmlData = """ + json.dumps([d['raw_xml'] for d in all_data], ensure_ascii=False) + """;
-        const allFilenames = """ + json.dumps([d['filename'] for d in all_data]) + """;
+        // Store plain text and raw XML data (null when they are in data/ and data/xml/)
+        const allPlainTextData = """)
+        if split_data:
+            f.write('null')
+        else:
+            _write_json_array(f, (d['plain_text'] for d in all_data))
+        f.write(""";
+        const allRawXmlData = """)
+        if embed_xml:
+            _write_json_array(f, (d['raw_xml'] for d in all_data))
+        else:
+            f.write('null')
+        f.write(""";
+        const allFilenames = """)
+        _write_json_array(f, (d['filename'] for d in all_data))
+        f.write(""";
         
         console.log('Data loaded:', allFilenames.length + ' files');
         
-        function downloadPlainText(index) {
+        // Tab buttons and contents, both in file order. Filtering reorders and
+        // hides buttons but never adds or removes any, so these stay valid.
+        const allTabs = Array.from(document.querySelectorAll('.tab'));
+        const allTabContents = Array.from(document.querySelectorAll('.tab-content'));
+        
+        // Fetch a file written next to the page, explaining the usual failure
+        async function fetchSidecar(path, hint) {
+            let response;
+            try {
+                response = await fetch(path);
+            } catch (e) {
+                throw new Error(`could not load ${path} (${e.message}). ` +
+                    `Serve this page over HTTP, or ${hint}.`);
+            }
+            if (!response.ok) {
+                throw new Error(`could not load ${path} (HTTP ${response.status})`);
+            }
+            return response;
+        }
+        
+        // Graph data and plain text of a file, fetched at most once
+        const fileData = new Map();
+        
+        function loadFile(index) {
+            if (!fileData.has(index)) {
+                const file = allGraphData
+                    ? Promise.resolve({ ...allGraphData[index], plainText: allPlainTextData[index] })
+                    : fetchSidecar(`data/${index}.json`, 'regenerate it without --split-data')
+                        .then(response => response.json());
+                // Forget failed loads so that they are retried
+                fileData.set(index, file.catch(e => {
+                    fileData.delete(index);
+                    throw e;
+                }));
+            }
+            return fileData.get(index);
+        }
+        
+        async function downloadPlainText(index) {
             try {
                 console.log('Downloading plain text for file', index, ':', allFilenames[index]);
-                const text = allPlainTextData[index];
+                const text = (await loadFile(index)).plainText;
                 const blob = new Blob([text], { type: 'text/plain;charset=utf-8' });
                 const url = URL.createObjectURL(blob);
                 const a = document.createElement('a');
@@ -944,10 +1376,18 @@ def generate_multi_file_html(files, output_path):
             }
         }
         
-        function viewRawXML(index) {
+        async function loadRawXML(index) {
+            if (allRawXmlData) {
+                return allRawXmlData[index];
+            }
+            const response = await fetchSidecar(`data/xml/${index}.xml`, 'regenerate it with --embed-xml');
+            return response.text();
+        }
+        
+        async function viewRawXML(index) {
             try {
                 console.log('Viewing raw XML for file', index, ':', allFilenames[index]);
-                document.getElementById('rawXmlContent').textContent = allRawXmlData[index];
+                document.getElementById('rawXmlContent').textContent = await loadRawXML(index);
                 document.getElementById('rawXmlModal').style.display = 'block';
             } catch (e) {
                 console.error('Error viewing raw XML:', e);
@@ -959,10 +1399,10 @@ def generate_multi_file_html(files, output_path):
             document.getElementById('rawXmlModal').style.display = 'none';
         }
         
-        function downloadRawXML(index) {
+        async function downloadRawXML(index) {
             try {
                 console.log('Downloading raw XML for file', index, ':', allFilenames[index]);
-                const xml = allRawXmlData[index];
+                const xml = await loadRawXML(index);
                 const blob = new Blob([xml], { type: 'application/xml;charset=utf-8' });
                 const url = URL.createObjectURL(blob);
                 const a = document.createElement('a');
@@ -986,124 +1426,147 @@ def generate_multi_file_html(files, output_path):
             }
         }
         
+        function hydrateTab(index) {
+            // Move the tab's deferred content into the page the first time it is shown
+            const template = document.getElementById(`tab-data-${index}`);
+            if (template) {
+                document.getElementById(`tab-${index}`).innerHTML = template.textContent;
+                template.remove();
+            }
+        }
+        
         function showTab(index) {
-            // Hide all tabs
-            document.querySelectorAll('.tab').forEach(t => t.classList.remove('active'));
-            document.querySelectorAll('.tab-content').forEach(c => c.classList.remove('active'));
+            hydrateTab(index);
+            
+            // Hide all tabs, dropping highlights in the one being left: hiding
+            // cancels their animation, and not every browser reports that
+            allTabContents.forEach(c => {
+                if (c.classList.contains('active') && c !== allTabContents[index]) {
+                    c.querySelectorAll('.node-highlighted, .text-highlighted').forEach(el => {
+                        el.classList.remove('node-highlighted', 'text-highlighted');
+                    });
+                }
+                c.classList.remove('active');
+            });
+            allTabs.forEach(t => t.classList.remove('active'));
             
             // Show selected tab
-            const tabs = document.querySelectorAll('.tab');
-            const tabToActivate = Array.from(tabs).find(t => parseInt(t.getAttribute('data-index')) === index);
+            const tabToActivate = allTabs[index];
             if (tabToActivate) {
                 tabToActivate.classList.add('active');
                 tabToActivate.scrollIntoView({ behavior: 'smooth', block: 'nearest' });
             }
-            document.getElementById(`tab-${index}`).classList.add('active');
+            allTabContents[index].classList.add('active');
             
-            // Initialize graph if not already done
-            if (!graphInstances[index] && allGraphData[index].nodes.length > 0) {
-                initGraph(index);
+            ensureGraph(index);
+        }
+        
+        // Initialize a tab's graph if not already done (tabs without nodes have no graph)
+        async function ensureGraph(index) {
+            const container = document.getElementById(`graph-${index}`);
+            if (!container || graphInstances[index]) return;
+            let file;
+            try {
+                file = await loadFile(index);
+            } catch (e) {
+                console.error('Error loading graph data:', e);
+                container.textContent = 'Error loading graph data: ' + e.message;
+                return;
+            }
+            // The tab may have been shown again, or left, while the data was
+            // loading. A hidden tab has no size to lay the graph out in, so
+            // leave it to the next showTab().
+            if (!graphInstances[index] && allTabContents[index].classList.contains('active')) {
+                initGraph(index, file);
             }
         }
         
+        // Filter controls, and each tab's attributes parsed once for filtering and sorting
+        const searchInput = document.getElementById('search');
+        const sortBySelect = document.getElementById('sortBy');
+        const minEventsSelect = document.getElementById('minEvents');
+        const minLinksSelect = document.getElementById('minLinks');
+        const taskFilterSelect = document.getElementById('taskFilter');
+        const tabMeta = allTabs.map(tab => ({
+            el: tab,
+            index: parseInt(tab.getAttribute('data-index')),
+            filename: tab.getAttribute('data-filename'),
+            search: tab.getAttribute('data-filename').toLowerCase(),
+            events: parseInt(tab.getAttribute('data-events')),
+            timexes: parseInt(tab.getAttribute('data-timexes')),
+            tlinks: parseInt(tab.getAttribute('data-tlinks')),
+            sentences: parseInt(tab.getAttribute('data-sentences')),
+            tasks: (tab.getAttribute('data-tasks') || 'none').split(',')
+        }));
+        
         function applyFilters() {
-            const search = document.getElementById('search').value.toLowerCase();
-            const sortBy = document.getElementById('sortBy').value;
-            const minEvents = parseInt(document.getElementById('minEvents').value);
-            const minLinks = parseInt(document.getElementById('minLinks').value);
-            const taskFilter = document.getElementById('taskFilter').value;
-            
-            const tabs = Array.from(document.querySelectorAll('.tab'));
+            const search = searchInput.value.toLowerCase();
+            const sortBy = sortBySelect.value;
+            const minEvents = parseInt(minEventsSelect.value);
+            const minLinks = parseInt(minLinksSelect.value);
+            const taskFilter = taskFilterSelect.value;
             
             // Filter tabs
-            let visibleTabs = tabs.filter(tab => {
-                const filename = tab.getAttribute('data-filename').toLowerCase();
-                const events = parseInt(tab.getAttribute('data-events'));
-                const tlinks = parseInt(tab.getAttribute('data-tlinks'));
-                const tasks = tab.getAttribute('data-tasks') || 'none';
-                
+            const visible = tabMeta.filter(meta => {
                 // Apply search filter
-                if (!filename.includes(search)) return false;
+                if (!meta.search.includes(search)) return false;
                 
                 // Apply numeric filters
-                if (events < minEvents) return false;
-                if (tlinks < minLinks) return false;
+                if (meta.events < minEvents) return false;
+                if (meta.tlinks < minLinks) return false;
                 
-                // Apply task filter
-                if (taskFilter !== 'all') {
-                    if (tasks === 'none') return false;
-                    
-                    const fileTasks = tasks.split(',');
-                    
-                    if (taskFilter === 'A' || taskFilter === 'B' || taskFilter === 'C') {
-                        // Single task - must have this task
-                        if (!fileTasks.includes(taskFilter)) return false;
-                    } else if (taskFilter === 'AB') {
-                        // Tasks A & B - must have both
-                        if (!fileTasks.includes('A') || !fileTasks.includes('B')) return false;
-                    }
+                // Apply task filter (files without tasks have ['none'])
+                if (taskFilter === 'A' || taskFilter === 'B' || taskFilter === 'C') {
+                    // Single task - must have this task
+                    if (!meta.tasks.includes(taskFilter)) return false;
+                } else if (taskFilter === 'AB') {
+                    // Tasks A & B - must have both
+                    if (!meta.tasks.includes('A') || !meta.tasks.includes('B')) return false;
                 }
                 
                 return true;
             });
             
             // Sort tabs
-            visibleTabs.sort((a, b) => {
-                const getValue = (tab, field) => {
-                    switch(field) {
-                        case 'filename': return tab.getAttribute('data-filename');
-                        case 'events': return parseInt(tab.getAttribute('data-events'));
-                        case 'timexes': return parseInt(tab.getAttribute('data-timexes'));
-                        case 'tlinks': return parseInt(tab.getAttribute('data-tlinks'));
-                        case 'sentences': return parseInt(tab.getAttribute('data-sentences'));
-                        default: return tab.getAttribute('data-filename');
-                    }
-                };
-                
-                const [field, order] = sortBy.split('-');
-                const aVal = getValue(a, field);
-                const bVal = getValue(b, field);
-                
-                let comparison = 0;
-                if (typeof aVal === 'string') {
-                    comparison = aVal.localeCompare(bVal);
-                } else {
-                    comparison = aVal - bVal;
-                }
-                
+            const [field, order] = sortBy.split('-');
+            const key = ['events', 'timexes', 'tlinks', 'sentences'].includes(field) ? field : 'filename';
+            visible.sort((a, b) => {
+                const comparison = key === 'filename'
+                    ? a.filename.localeCompare(b.filename)
+                    : a[key] - b[key];
                 return order === 'desc' ? -comparison : comparison;
             });
             
             // Hide all tabs first
-            tabs.forEach(tab => tab.style.display = 'none');
+            tabMeta.forEach(meta => meta.el.classList.add('hidden'));
             
-            // Show and reorder visible tabs
-            const tabsContainer = document.getElementById('tabs');
-            visibleTabs.forEach(tab => {
-                tab.style.display = 'block';
-                tabsContainer.appendChild(tab); // Move to end (reorder)
+            // Show visible tabs, reordered off-document and put back in one go
+            const fragment = document.createDocumentFragment();
+            visible.forEach(meta => {
+                meta.el.classList.remove('hidden');
+                fragment.appendChild(meta.el);
             });
+            document.getElementById('tabs').appendChild(fragment);
             
             // Update match count
             document.getElementById('matchCount').textContent = 
-                `Showing ${visibleTabs.length} of ${tabs.length} files`;
+                `Showing ${visible.length} of ${tabMeta.length} files`;
             
             // If current tab is hidden, show first visible tab
             const activeTab = document.querySelector('.tab.active');
-            if (!activeTab || activeTab.style.display === 'none') {
-                if (visibleTabs.length > 0) {
-                    const firstIndex = parseInt(visibleTabs[0].getAttribute('data-index'));
-                    showTab(firstIndex);
+            if (!activeTab || activeTab.classList.contains('hidden')) {
+                if (visible.length > 0) {
+                    showTab(visible[0].index);
                 }
             }
         }
         
         function resetFilters() {
-            document.getElementById('search').value = '';
-            document.getElementById('sortBy').value = 'filename';
-            document.getElementById('taskFilter').value = 'all';
-            document.getElementById('minEvents').value = '0';
-            document.getElementById('minLinks').value = '0';
+            searchInput.value = '';
+            sortBySelect.value = 'filename';
+            taskFilterSelect.value = 'all';
+            minEventsSelect.value = '0';
+            minLinksSelect.value = '0';
             applyFilters();
         }
         
@@ -1112,8 +1575,34 @@ def generate_multi_file_html(files, output_path):
             applyFilters();
         });
         
-        function initGraph(index) {
-            const data = allGraphData[index];
+        // Graph data is stored one array per field; build the node and link
+        // objects D3 works with only when a graph is first drawn
+        function buildGraphData(file) {
+            const { nodes: n, links: l } = file;
+            const nodes = n.ids.map((id, i) => {
+                const type = NODE_TYPES[n.types[i]];
+                return {
+                    id,
+                    x: n.x[i],
+                    y: n.y[i],
+                    label: n.labels[i],
+                    type,
+                    fullText: n.fullTexts[i],
+                    [type === 'event' ? 'class' : 'value']: n.details[i]
+                };
+            });
+            const links = l.source.map((source, i) => ({
+                source,
+                target: l.target[i],
+                relation: l.relation[i],
+                sourceId: n.ids[source],
+                targetId: n.ids[l.target[i]]
+            }));
+            return { nodes, links };
+        }
+        
+        function initGraph(index, file) {
+            const data = buildGraphData(file);
             const container = document.getElementById(`graph-${index}`);
             const width = container.clientWidth;
             const height = 500;
@@ -1161,19 +1650,25 @@ def generate_multi_file_html(files, output_path):
             
             svg.call(zoom);
             
-            function boundedBox() {
-                for (let node of data.nodes) {
-                    node.x = Math.max(margin, Math.min(width - margin, node.x));
-                    node.y = Math.max(margin, Math.min(height - margin, node.y));
-                }
-            }
+            // Scale the layout precomputed by the generator to the graph area
+            data.nodes.forEach(d => {
+                d.x = margin + d.x * (width - 2 * margin);
+                d.y = margin + d.y * (height - 2 * margin);
+            });
             
+            // Nodes start in place, so the simulation only runs once a node
+            // is dragged or the graph is reset. It cools about twice as fast
+            // as D3's defaults, and repulsion ignores distant nodes.
             const simulation = d3.forceSimulation(data.nodes)
+                .alphaDecay(0.05)
+                .alphaMin(0.01)
+                .velocityDecay(0.5)
                 .force('link', d3.forceLink(data.links).distance(120).strength(0.5))
-                .force('charge', d3.forceManyBody().strength(-300))
+                .force('charge', d3.forceManyBody().strength(-300).theta(0.9).distanceMax(400))
                 .force('center', d3.forceCenter(width / 2, height / 2))
                 .force('collision', d3.forceCollide().radius(35))
-                .force('bounds', boundedBox);
+                .alpha(0)
+                .stop();
             
             const link = g.append('g')
                 .selectAll('line')
@@ -1243,12 +1738,7 @@ def generate_multi_file_html(files, output_path):
             node.append('title')
                 .text(d => `${d.id}: "${d.fullText}"`);
             
-            simulation.on('tick', () => {
-                data.nodes.forEach(d => {
-                    d.x = Math.max(margin, Math.min(width - margin, d.x));
-                    d.y = Math.max(margin, Math.min(height - margin, d.y));
-                });
-                
+            function render() {
                 link
                     .attr('x1', d => d.source.x)
                     .attr('y1', d => d.source.y)
@@ -1256,7 +1746,36 @@ def generate_multi_file_html(files, output_path):
                     .attr('y2', d => d.target.y);
                 
                 node.attr('transform', d => `translate(${d.x},${d.y})`);
+            }
+            
+            // Keep nodes inside the graph area (after velocities are applied)
+            function clamp() {
+                data.nodes.forEach(d => {
+                    d.x = Math.max(margin, Math.min(width - margin, d.x));
+                    d.y = Math.max(margin, Math.min(height - margin, d.y));
+                });
+            }
+            
+            simulation.on('tick', () => {
+                clamp();
+                render();
+                graphInstances[index].bounds = null;
             });
+            render();
+            
+            // Run a reheated simulation until it cools down without drawing
+            // the frames in between, then draw the result once
+            function settle() {
+                simulation.stop();
+                const ticks = Math.ceil(Math.log(simulation.alphaMin() / simulation.alpha()) /
+                                        Math.log(1 - simulation.alphaDecay()));
+                for (let i = 0; i < ticks; ++i) {
+                    simulation.tick();
+                    clamp();
+                }
+                render();
+                graphInstances[index].bounds = null;
+            }
             
             graphInstances[index] = { 
                 svg, 
@@ -1265,41 +1784,61 @@ def generate_multi_file_html(files, output_path):
                 g, 
                 nodeLabel,
                 node,
+                data,
+                settle,
+                width,
+                height,
+                bounds: null,  // Cached bounding box of the drawing, null once nodes move
                 showingText: false 
             };
             
-            setTimeout(() => fitToView(index), 1000);
+            // The layout is final already, so fit it straight away
+            fitToView(index);
         }
         
         function resetGraph(index) {
             if (graphInstances[index]) {
-                allGraphData[index].nodes.forEach(d => {
+                const instance = graphInstances[index];
+                instance.data.nodes.forEach(d => {
                     d.fx = null;
                     d.fy = null;
                 });
-                graphInstances[index].simulation.alpha(1).restart();
+                instance.simulation.alpha(1);
+                instance.settle();
+                fitToView(index);
             }
         }
         
         function fitToView(index) {
             if (graphInstances[index]) {
-                const { svg, zoom, g } = graphInstances[index];
-                const bounds = g.node().getBBox();
-                const width = svg.attr('width');
-                const height = svg.attr('height');
+                const instance = graphInstances[index];
+                const { svg, zoom, g, width, height } = instance;
+                // getBBox() forces a layout, so only measure after nodes moved
+                const bounds = instance.bounds || (instance.bounds = g.node().getBBox());
                 
-                if (bounds.width === 0 || bounds.height === 0) return;
+                if (bounds.width === 0 || bounds.height === 0) {
+                    instance.bounds = null;  // Measured while hidden; try again next time
+                    return;
+                }
                 
                 const scale = 0.9 / Math.max(bounds.width / width, bounds.height / height);
                 const translate = [
                     width / 2 - scale * (bounds.x + bounds.width / 2),
                     height / 2 - scale * (bounds.y + bounds.height / 2)
                 ];
+                const transform = d3.zoomIdentity
+                    .translate(translate[0], translate[1])
+                    .scale(scale);
+                
+                // Skip the transition when the view is still the fitted one
+                const current = d3.zoomTransform(svg.node());
+                if (Math.abs(current.k - transform.k) < 1e-3 &&
+                        Math.abs(current.x - transform.x) < 0.5 && Math.abs(current.y - transform.y) < 0.5) {
+                    return;
+                }
                 
                 svg.transition().duration(750)
-                    .call(zoom.transform, d3.zoomIdentity
-                        .translate(translate[0], translate[1])
-                        .scale(scale));
+                    .call(zoom.transform, transform);
             }
         }
         
@@ -1321,7 +1860,7 @@ def generate_multi_file_html(files, output_path):
             if (graphInstances[index]) {
                 const instance = graphInstances[index];
                 instance.showingText = !instance.showingText;
-                const data = allGraphData[index];
+                instance.bounds = null;  // Labels change the drawing's size
                 
                 instance.nodeLabel.text(d => {
                     if (instance.showingText) {
@@ -1348,91 +1887,67 @@ def generate_multi_file_html(files, output_path):
                     .classed('node-highlighted', true);
                 
                 // Find the node position and pan to it
-                const nodeData = allGraphData[index].nodes.find(n => n.id === nodeId);
+                const nodeData = instance.data.nodes.find(n => n.id === nodeId);
                 if (nodeData) {
-                    const width = instance.svg.attr('width');
-                    const height = instance.svg.attr('height');
+                    const { width, height } = instance;
                     const scale = d3.zoomTransform(instance.svg.node()).k || 1;
                     
                     instance.svg.transition().duration(500)
                         .call(instance.zoom.transform, d3.zoomIdentity
                             .translate(width / 2 - nodeData.x * scale, height / 2 - nodeData.y * scale)
                             .scale(scale));
-                    
-                    // Remove highlight after 2 seconds
-                    setTimeout(() => {
-                        instance.node.classed('node-highlighted', false);
-                    }, 2000);
                 }
             }
         }
         
         function highlightTextElement(index, nodeId) {
             // Find the tab content
-            const tabContent = document.querySelectorAll('.tab-content')[index];
+            const tabContent = allTabContents[index];
             if (!tabContent) return;
             
             // Remove previous text highlights
-            tabContent.querySelectorAll('.event, .timex').forEach(el => {
-                el.style.outline = '';
-                el.style.outlineOffset = '';
+            tabContent.querySelectorAll('.text-highlighted').forEach(el => {
+                el.classList.remove('text-highlighted');
             });
             
             // Find and highlight the text element
             const textElement = tabContent.querySelector(`[data-id="${nodeId}"]`);
             if (textElement) {
-                textElement.style.outline = '3px solid #f39c12';
-                textElement.style.outlineOffset = '2px';
+                textElement.classList.add('text-highlighted');
                 
                 // Scroll the text section into view
                 textElement.scrollIntoView({ behavior: 'smooth', block: 'center' });
-                
-                // Remove highlight after 2 seconds
-                setTimeout(() => {
-                    textElement.style.outline = '';
-                    textElement.style.outlineOffset = '';
-                }, 2000);
             }
         }
         
-        // Initialize first graph
-        if (allGraphData[0].nodes.length > 0) {
-            initGraph(0);
+        // Drop a highlight class once its animation has played, or was cancelled
+        // (showTab() also clears highlights where animationcancel is not fired)
+        function clearHighlight(event) {
+            const highlighted = event.target.closest('.node-highlighted, .text-highlighted');
+            if (highlighted) {
+                highlighted.classList.remove('node-highlighted', 'text-highlighted');
+            }
         }
+        document.addEventListener('animationend', clearHighlight);
+        document.addEventListener('animationcancel', clearHighlight);
         
-        // Attach click handlers to events and timexes in text sections
-        function initTextClickHandlers() {
-            document.querySelectorAll('.tab-content').forEach((tabContent, index) => {
-                // Find all events and timexes in this tab
-                const events = tabContent.querySelectorAll('.event[data-id]');
-                const timexes = tabContent.querySelectorAll('.timex[data-id]');
-                
-                events.forEach(eventEl => {
-                    eventEl.style.cursor = 'pointer';
-                    eventEl.addEventListener('click', function() {
-                        const nodeId = this.getAttribute('data-id');
-                        highlightNode(index, nodeId);
-                    });
-                });
-                
-                timexes.forEach(timexEl => {
-                    timexEl.style.cursor = 'pointer';
-                    timexEl.addEventListener('click', function() {
-                        const nodeId = this.getAttribute('data-id');
-                        highlightNode(index, nodeId);
-                    });
-                });
-            });
-        }
+        // Initialize first graph
+        ensureGraph(0);
         
-        // Initialize click handlers after page load
-        initTextClickHandlers();
+        // Clicking an event or timex in a tab's text highlights its graph node.
+        // One listener on the document covers every tab, including ones
+        // hydrated later.
+        document.addEventListener('click', event => {
+            const textElement = event.target.closest('.event[data-id], .timex[data-id]');
+            const tabContent = textElement && textElement.closest('.tab-content');
+            if (tabContent) {
+                const index = parseInt(tabContent.id.slice('tab-'.length));
+                highlightNode(index, textElement.getAttribute('data-id'));
+            }
+        });
     </script>
 </body>
-</html>"""
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(html)
+</html>""")
     
     print(f"\n✓ Multi-file visualization exported to: {output_path}")
     print(f"  Total files: {len(files)}")
@@ -1450,18 +1965,29 @@ def main():
     parser.add_argument('directories', nargs='+', help='Directories containing .tml files (can specify multiple)')
     parser.add_argument('--output', '-o', default='all_files.html', help='Output HTML file (default: all_files.html)')
     parser.add_argument('--limit', '-l', type=int, help='Limit number of files to process')
+    parser.add_argument('--gzip', action='store_true', help='Write the output gzip-compressed, as <output>.gz, with .gz copies of data/ files')
+    parser.add_argument('--embed-xml', action='store_true',
+                        help='Embed the raw XML in the page instead of writing it to data/xml/ next to it')
+    parser.add_argument('--split-data', action='store_true',
+                        help='Write graph data and plain text to data/ next to the page and load them per tab')
+    parser.add_argument('--jobs', '-j', type=int, help='Number of parsing processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true', help=f'Do not read or write the parse cache ({CACHE_DIR})')
     
     args = parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs must be at least 1')
     
     # Find all TML files from all directories
     tml_files = []
     for directory in args.directories:
-        path = Path(directory)
-        if not path.exists():
+        if not os.path.isdir(directory):
             print(f"Warning: Directory not found: {directory}")
             continue
         
-        dir_files = sorted(path.glob('*.tml'))
+        # scandir entries carry their file type, so no extra stat per file
+        with os.scandir(directory) as entries:
+            dir_files = sorted(entry.path for entry in entries
+                               if entry.name.endswith('.tml') and entry.is_file())
         tml_files.extend(dir_files)
         print(f"Found {len(dir_files)} files in {directory}")
     
@@ -1474,7 +2000,9 @@ def main():
     
     print(f"\nTotal: {len(tml_files)} .tml files")
     
-    generate_multi_file_html(tml_files, args.output)
+    generate_multi_file_html(tml_files, args.output, cache_dir=None if args.no_cache else CACHE_DIR,
+                             compress=args.gzip, embed_xml=args.embed_xml, split_data=args.split_data,
+                             jobs=args.jobs)
 
 
 if __name__ == '__main__':